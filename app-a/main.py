@@ -12,10 +12,44 @@ import socket
 import asyncio
 import random
 import httpx
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, Request
+from fastapi.responses import ORJSONResponse
 from typing import Dict, Any
 
-app = FastAPI(title="VPC Test App A - Request Chain Tracer")
+
+# Per-call timeout for short probes; a bare float would replace the whole
+# Timeout and drop the 5s connect limit
+PROBE_TIMEOUT = httpx.Timeout(10.0, connect=5.0)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Create one shared HTTP client per process and close it on shutdown.
+
+    Reusing the client keeps connections pooled across requests instead of
+    paying a fresh TCP handshake for every outbound call. HTTP/2 is
+    negotiated over TLS only, so plain http:// VPC calls stay on pooled
+    HTTP/1.1 keep-alive connections.
+    """
+    app.state.http = httpx.AsyncClient(
+        http2=True,
+        timeout=httpx.Timeout(60.0, connect=5.0),
+        limits=httpx.Limits(
+            max_keepalive_connections=20,
+            max_connections=100,
+            keepalive_expiry=30.0,
+        ),
+    )
+    yield
+    await app.state.http.aclose()
+
+
+app = FastAPI(
+    title="VPC Test App A - Request Chain Tracer",
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse,
+)
 
 # Get App B URL from environment (internal VPC URL)
 APP_B_URL = os.getenv("APP_B_URL", "http://test-header-b:8080")
@@ -26,6 +60,9 @@ FUNCTION_URL = os.getenv("FUNCTION_URL", "http://test-fibonacci:8080")
 # Get API key for calling private functions
 INTERNAL_API_KEY = os.getenv("INTERNAL_API_KEY", "")
 
+# Get this pod's hostname (reported as app_a_pod_name)
+POD_NAME = socket.gethostname()
+
 
 @app.get("/")
 async def root():
@@ -38,7 +75,7 @@ async def root():
 
 
 @app.get("/call-b")
-async def call_b(request: Request, fib: int = None) -> Dict[str, Any]:
+async def call_b(request: Request, burn_seconds: float = None, verbose: bool = False) -> Dict[str, Any]:
     """Receive external request, call App B internally, return both results.
 
     This endpoint:
@@ -47,21 +84,18 @@ async def call_b(request: Request, fib: int = None) -> Dict[str, Any]:
     3. Returns both sets of information for comparison
 
     Query params:
-    - fib: Optional Fibonacci number to pass to App B for CPU load testing
+    - burn_seconds: Optional seconds of CPU burn to pass to App B for load testing
+    - verbose: If true, echo all headers seen by App A and App B
 
     This allows us to see the difference between:
     - External request (browser/curl → App A through load balancer)
     - Internal request (App A → App B within VPC)
     """
-    # Get this pod's hostname
-    app_a_pod_name = socket.gethostname()
-
     # NO delay in app-a - it processes immediately
     app_a_delay = 0
 
     # Capture what App A received from external caller
     app_a_client_ip = request.client.host if request.client else "unknown"
-    app_a_headers = dict(request.headers)
     app_a_specific = {
         "x-forwarded-for": request.headers.get("x-forwarded-for"),
         "x-real-ip": request.headers.get("x-real-ip"),
@@ -71,35 +105,36 @@ async def call_b(request: Request, fib: int = None) -> Dict[str, Any]:
     }
 
     # Make internal call to App B
+    client = request.app.state.http
     try:
-        async with httpx.AsyncClient() as client:
-            # Add fib parameter if provided
-            url = f"{APP_B_URL}/diagnostic"
-            params = {"fib": fib} if fib is not None else {}
-            response = await client.get(url, params=params, timeout=60.0)
-            app_b_response = response.json()
-            call_success = True
-            error_message = None
+        # Add burn_seconds / verbose parameters if provided
+        url = f"{APP_B_URL}/diagnostic"
+        params = {"burn_seconds": burn_seconds} if burn_seconds is not None else {}
+        if verbose:
+            params["verbose"] = True
+        response = await client.get(url, params=params)
+        app_b_response = response.json()
+        call_success = True
+        error_message = None
     except Exception as e:
         app_b_response = None
         call_success = False
         error_message = str(e)
 
-    return {
+    result = {
         "test_description": "External request to App A, which then calls App B internally",
-        "app_a_pod_name": app_a_pod_name,
+        "app_a_pod_name": POD_NAME,
         "app_a_delay_seconds": app_a_delay,
-        "fib_param": fib,
+        "burn_seconds_param": burn_seconds,
         "app_a_received": {
             "description": "What App A saw from external caller (through load balancer)",
             "client_ip": app_a_client_ip,
             "specific_headers": app_a_specific,
-            "all_headers": app_a_headers,
         },
         "internal_call_to_app_b": {
             "description": "App A called App B using internal VPC URL",
             "url_used": APP_B_URL,
-            "fib_passed_to_b": fib,
+            "burn_seconds_passed_to_b": burn_seconds,
             "call_success": call_success,
             "error": error_message,
         },
@@ -109,34 +144,47 @@ async def call_b(request: Request, fib: int = None) -> Dict[str, Any]:
         },
     }
 
+    # Echo App A's full headers only on request
+    if verbose:
+        result["app_a_received"]["all_headers"] = dict(request.headers)
+
+    return result
+
 
 @app.get("/test-load-balancing")
-async def test_load_balancing() -> Dict[str, Any]:
+async def test_load_balancing(request: Request) -> Dict[str, Any]:
     """Make multiple calls to App B to test internal load balancing.
 
     If load balancing works, we should see different pod IPs.
     If not, all calls will go to the same pod.
+
+    Calls share App A's pooled keep-alive connections, so a balancer that
+    routes per connection (L4) pins every request on a reused connection
+    to one pod, while per-request (L7) routing spreads them regardless.
     """
     results = []
     ip_counts = {}
+    client = request.app.state.http
 
-    # Make 20 calls to App B with NEW connections each time
-    for i in range(20):
+    # Make 20 concurrent calls to App B over the shared connection pool
+    tasks = [client.get(f"{APP_B_URL}/diagnostic", timeout=PROBE_TIMEOUT) for _ in range(20)]
+    responses = await asyncio.gather(*tasks, return_exceptions=True)
+
+    for i, response in enumerate(responses):
         try:
-            # Create new client for each request (forces new TCP connection)
-            async with httpx.AsyncClient() as client:
-                response = await client.get(f"{APP_B_URL}/diagnostic", timeout=10.0)
-                data = response.json()
-                pod_ip = data.get("client_ip", "unknown")
+            if isinstance(response, Exception):
+                raise response
+            data = response.json()
+            pod_ip = data.get("client_ip", "unknown")
 
-                results.append({
-                    "call_number": i + 1,
-                    "pod_ip": pod_ip,
-                    "success": True
-                })
+            results.append({
+                "call_number": i + 1,
+                "pod_ip": pod_ip,
+                "success": True
+            })
 
-                # Count IPs
-                ip_counts[pod_ip] = ip_counts.get(pod_ip, 0) + 1
+            # Count IPs
+            ip_counts[pod_ip] = ip_counts.get(pod_ip, 0) + 1
 
         except Exception as e:
             results.append({
@@ -181,12 +229,8 @@ async def call_function(request: Request, n: int = 10) -> Dict[str, Any]:
     3. http://test-fibonacci:8080?n=N
     """
     # Get this pod's info
-    app_a_pod_name = socket.gethostname()
     app_a_client_ip = request.client.host if request.client else "unknown"
 
-    # Capture what App A received from external caller
-    app_a_headers = dict(request.headers)
-
     # Test different URL patterns (using correct /package/function path)
     # First try internal VPC patterns
     internal_patterns = [
@@ -199,54 +243,43 @@ async def call_function(request: Request, n: int = 10) -> Dict[str, Any]:
     # Format: /route/package/function
     public_url = f"https://vpc-internal-lb-test-63mdu.ondigitalocean.app/fib/fibonacci/__main__?n={n}"
 
-    results = []
+    client = request.app.state.http
 
-    # Test internal patterns
-    for url in internal_patterns:
+    async def probe(url: str, headers: Dict[str, str] = None, **extra) -> Dict[str, Any]:
+        """GET one function URL and summarize the outcome."""
         try:
-            async with httpx.AsyncClient() as client:
-                response = await client.get(url, timeout=10.0)
-                results.append({
-                    "url": url,
-                    "success": True,
-                    "status_code": response.status_code,
-                    "response": response.json() if response.status_code == 200 else response.text[:200]
-                })
+            response = await client.get(url, headers=headers, timeout=PROBE_TIMEOUT)
+            return {
+                "url": url,
+                **extra,
+                "success": True,
+                "status_code": response.status_code,
+                "response": response.json() if response.status_code == 200 else response.text[:200]
+            }
         except Exception as e:
-            results.append({
+            return {
                 "url": url,
+                **extra,
                 "success": False,
                 "error": str(e)[:200]
-            })
+            }
 
     # Test public URL with API key authentication
-    public_result = None
     headers = {"X-API-Key": INTERNAL_API_KEY} if INTERNAL_API_KEY else {}
 
-    try:
-        async with httpx.AsyncClient() as client:
-            response = await client.get(public_url, headers=headers, timeout=10.0)
-            public_result = {
-                "url": public_url,
-                "api_key_provided": bool(INTERNAL_API_KEY),
-                "success": True,
-                "status_code": response.status_code,
-                "response": response.json() if response.status_code == 200 else response.text[:200]
-            }
-    except Exception as e:
-        public_result = {
-            "url": public_url,
-            "api_key_provided": bool(INTERNAL_API_KEY),
-            "success": False,
-            "error": str(e)[:200]
-        }
+    # Probe every internal pattern and the public URL concurrently - failures
+    # are usually timeouts, so wall time is the slowest probe, not the sum
+    results, public_result = await asyncio.gather(
+        asyncio.gather(*[probe(url) for url in internal_patterns]),
+        probe(public_url, headers=headers, api_key_provided=bool(INTERNAL_API_KEY)),
+    )
 
     # Check if any internal pattern succeeded
     any_internal_success = any(r["success"] and r.get("status_code") == 200 for r in results)
 
     return {
         "test_description": "Test calling fibonacci function via internal VPC service name AND public URL",
-        "app_a_pod_name": app_a_pod_name,
+        "app_a_pod_name": POD_NAME,
         "app_a_client_ip": app_a_client_ip,
         "fibonacci_input": n,
         "app_a_received": {
@@ -1,49 +1,92 @@
 """App B: Diagnostic Receiver with CPU Load Testing
 
 Simple FastAPI app that returns all request information received.
-Now with Fibonacci calculation for CPU load testing and autoscaling.
+Now with a timed CPU burn for load testing and autoscaling.
 Fire-and-forget mode: returns 202 immediately, logs results when done.
 """
 
 import asyncio
+import hashlib
+import os
 import random
 import socket
 import time
 import logging
-from fastapi import FastAPI, Request, Query, BackgroundTasks
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Request, Query
+from fastapi.responses import ORJSONResponse
 from typing import Dict, Any, Optional
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-app = FastAPI(title="VPC Test App B - Diagnostic Receiver")
+# Get this pod's hostname (reported as app_b_pod_name)
+POD_NAME = socket.gethostname()
 
+# CPU-bound work runs in subprocesses so it never holds the event loop's GIL
+executor = ProcessPoolExecutor(max_workers=os.cpu_count())
 
-def fibonacci(n: int) -> int:
-    """Recursive Fibonacci - exponentially CPU intensive."""
-    if n <= 1:
-        return n
-    return fibonacci(n - 1) + fibonacci(n - 2)
+# Upper bound for one CPU burn - a running burn cannot be cancelled
+MAX_BURN_SECONDS = 300
 
+# Strong references to in-flight fire-and-forget CPU burns
+background_jobs = set()
 
-def calculate_and_log_fibonacci(n: int, pod_name: str):
-    """Background task: Calculate fibonacci and log result."""
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Shut the process pool down when the app stops."""
+    yield
+    executor.shutdown(wait=False, cancel_futures=True)
+
+
+app = FastAPI(
+    title="VPC Test App B - Diagnostic Receiver",
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse,
+)
+
+
+def burn_cpu(seconds: float) -> int:
+    """Busy-loop SHA-256 for `seconds` of wall time - predictable CPU load.
+
+    Returns the number of hash rounds completed.
+    """
+    deadline = time.perf_counter() + seconds
+    h = hashlib.sha256(b"")
+    rounds = 0
+    while time.perf_counter() < deadline:
+        h.update(h.digest())
+        rounds += 1
+    return rounds
+
+
+def burn_and_log(seconds: float, pod_name: str):
+    """Background task: Burn CPU for the requested time and log result."""
     start_time = time.time()
-    result = fibonacci(n)
+    rounds = burn_cpu(seconds)
     duration = time.time() - start_time
 
     log_data = {
         "app_b_pod_name": pod_name,
         "load_test": {
-            "type": "fibonacci",
-            "input": n,
-            "result": result,
+            "type": "cpu_burn",
+            "input": seconds,
+            "hash_rounds": rounds,
             "duration_seconds": round(duration, 2)
         }
     }
 
-    logger.info(f"FIBONACCI_RESULT: {log_data}")
+    logger.info(f"CPU_BURN_RESULT: {log_data}")
+
+
+def finish_background_job(future: asyncio.Future):
+    """Drop a completed CPU burn and log it if the subprocess failed."""
+    background_jobs.discard(future)
+    if not future.cancelled() and future.exception() is not None:
+        logger.error("CPU burn failed", exc_info=future.exception())
 
 
 @app.get("/")
@@ -55,36 +98,45 @@ async def root():
 @app.get("/diagnostic", status_code=202)
 async def diagnostic(
     request: Request,
-    background_tasks: BackgroundTasks,
-    fib: Optional[int] = Query(None, description="Fibonacci number to calculate (CPU load)")
+    burn_seconds: Optional[float] = Query(
+        None,
+        ge=0,
+        le=MAX_BURN_SECONDS,
+        allow_inf_nan=False,
+        description="Seconds of CPU to burn (CPU load)"
+    ),
+    verbose: bool = Query(False, description="Include all request headers in the response")
 ) -> Dict[str, Any]:
     """Return all request information received.
 
     Fire-and-forget mode:
-    - If fib parameter provided, returns 202 immediately
-    - Calculates fibonacci in background
+    - If burn_seconds parameter provided, returns 202 immediately
+    - Burns CPU in a worker process
     - Logs result to DO logs when complete
 
     Query params:
-    - fib: If provided, calculate fibonacci(fib) in background - VERY CPU intensive!
-           fib(35) ~= 1-2s, fib(38) ~= 5-8s, fib(40) ~= 30s, fib(42) ~= 2min
+    - burn_seconds: If provided, keep one CPU core busy for this many seconds
+                    in background (e.g. 30 = ~30 CPU-seconds of load),
+                    0 to MAX_BURN_SECONDS
+    - verbose: If true, also echo every request header as all_headers
     """
-    # Get this pod's hostname
-    app_b_pod_name = socket.gethostname()
-
     # Get client IP
     client_ip = request.client.host if request.client else "unknown"
 
-    # Fire-and-forget fibonacci calculation
-    if fib is not None:
-        # Add background task - returns immediately
-        background_tasks.add_task(calculate_and_log_fibonacci, fib, app_b_pod_name)
+    # Fire-and-forget CPU burn
+    if burn_seconds is not None:
+        # Schedule on the process pool - returns immediately
+        future = asyncio.get_running_loop().run_in_executor(
+            executor, burn_and_log, burn_seconds, POD_NAME
+        )
+        background_jobs.add(future)
+        future.add_done_callback(finish_background_job)
 
         load_info = {
-            "type": "fibonacci_async",
-            "input": fib,
+            "type": "cpu_burn_async",
+            "input": burn_seconds,
             "status": "accepted",
-            "message": "Calculation running in background, will log when complete"
+            "message": "CPU burn running in background, will log when complete"
         }
     else:
         # Legacy: random sleep delay (synchronous for backward compatibility)
@@ -97,9 +149,6 @@ async def diagnostic(
             "duration_seconds": app_b_delay
         }
 
-    # Extract all headers
-    all_headers = dict(request.headers)
-
     # Extract specific headers of interest
     specific_headers = {
         "x-forwarded-for": request.headers.get("x-forwarded-for"),
@@ -109,18 +158,23 @@ async def diagnostic(
         "host": request.headers.get("host"),
     }
 
-    return {
+    response = {
         "app": "test-header-b",
-        "app_b_pod_name": app_b_pod_name,
+        "app_b_pod_name": POD_NAME,
         "load_test": load_info,
         "client_ip": client_ip,
         "specific_headers": specific_headers,
-        "all_headers": all_headers,
         "method": request.method,
         "path": str(request.url.path),
         "full_url": str(request.url),
     }
 
+    # Extract all headers (verbose mode only)
+    if verbose:
+        response["all_headers"] = dict(request.headers)
+
+    return response
+
 
 @app.get("/health")
 async def health():
@@ -9,18 +9,29 @@ Usage:
     Returns: {"n": 10, "result": 55, "duration_seconds": 0.001}
 """
 
-import json
 import os
 import time
 import socket
-import sys
+
+# Instance identifier - warm invocations reuse the container, so compute once
+INSTANCE_ID = f"{socket.gethostname()}-{os.getpid()}"
 
 
 def fibonacci(n: int) -> int:
-    """Recursive Fibonacci - exponentially CPU intensive."""
-    if n <= 1:
-        return n
-    return fibonacci(n - 1) + fibonacci(n - 2)
+    """Iterative Fibonacci - n additions, no call-stack growth."""
+    a, b = 0, 1
+    for _ in range(n):
+        a, b = b, a + b
+    return a
+
+
+def respond(status: int, body: dict) -> dict:
+    """Build a web action response; the platform JSON-encodes dict bodies."""
+    return {
+        'statusCode': status,
+        'headers': {'Content-Type': 'application/json'},
+        'body': body
+    }
 
 
 def main(event, context):
@@ -35,10 +46,7 @@ def main(event, context):
     Returns:
         dict: Response with statusCode, body, and headers
     """
-    # Instance identifier
-    instance_id = f"{socket.gethostname()}-{os.getpid()}"
-
-    print(f"[{instance_id}] Function invoked at {time.strftime('%H:%M:%S')}", flush=True)
+    print(f"[{INSTANCE_ID}] Function invoked at {time.strftime('%H:%M:%S')}", flush=True)
 
     # Extract HTTP headers
     http_data = event.get('__ow_headers', {})
@@ -48,17 +56,13 @@ def main(event, context):
     provided_api_key = http_data.get('x-api-key')
 
     if not expected_api_key or provided_api_key != expected_api_key:
-        print(f"[{instance_id}] Authentication failed", flush=True)
-        return {
-            'statusCode': 403,
-            'headers': {'Content-Type': 'application/json'},
-            'body': json.dumps({
-                'error': 'Forbidden',
-                'message': 'Authentication failed.'
-            })
-        }
+        print(f"[{INSTANCE_ID}] Authentication failed", flush=True)
+        return respond(403, {
+            'error': 'Forbidden',
+            'message': 'Authentication failed.'
+        })
 
-    print(f"[{instance_id}] Authentication successful", flush=True)
+    print(f"[{INSTANCE_ID}] Authentication successful", flush=True)
 
     # Capture caller information
     caller_info = {
@@ -77,15 +81,11 @@ def main(event, context):
     n_str = event.get('n')
 
     if n_str is None:
-        return {
-            'statusCode': 400,
-            'headers': {'Content-Type': 'application/json'},
-            'body': json.dumps({
-                'error': 'Missing required parameter "n"',
-                'usage': 'GET /fibonacci?n=10',
-                'note': 'n should be between 0 and 40 for reasonable performance'
-            })
-        }
+        return respond(400, {
+            'error': 'Missing required parameter "n"',
+            'usage': 'GET /fibonacci?n=10',
+            'note': 'n must be an integer between 0 and 45'
+        })
 
     # Validate and parse n
     try:
@@ -93,42 +93,30 @@ def main(event, context):
         if n < 0:
             raise ValueError("n must be non-negative")
         if n > 45:
-            return {
-                'statusCode': 400,
-                'headers': {'Content-Type': 'application/json'},
-                'body': json.dumps({
-                    'error': 'n too large (max 45)',
-                    'reason': 'Values above 45 take too long to compute'
-                })
-            }
-    except ValueError as e:
-        return {
-            'statusCode': 400,
-            'headers': {'Content-Type': 'application/json'},
-            'body': json.dumps({
-                'error': f'Invalid parameter "n": {str(e)}',
-                'received': n_str
+            return respond(400, {
+                'error': 'n too large (max 45)',
+                'reason': 'The supported input range is 0 to 45'
             })
-        }
+    except ValueError as e:
+        return respond(400, {
+            'error': f'Invalid parameter "n": {str(e)}',
+            'received': n_str
+        })
 
     # Calculate fibonacci with timing
-    print(f"[{instance_id}] Starting fibonacci({n}) calculation...", flush=True)
+    print(f"[{INSTANCE_ID}] Starting fibonacci({n}) calculation...", flush=True)
     start_time = time.time()
     result = fibonacci(n)
     duration = time.time() - start_time
-    print(f"[{instance_id}] Completed in {duration:.2f}s. Result: {result}", flush=True)
+    print(f"[{INSTANCE_ID}] Completed in {duration:.2f}s. Result: {result}", flush=True)
 
     # Return success response with caller information
-    return {
-        'statusCode': 200,
-        'headers': {'Content-Type': 'application/json'},
-        'body': json.dumps({
-            'n': n,
-            'result': result,
-            'duration_seconds': round(duration, 4),
-            'function': 'fibonacci',
-            'note': 'Calculated using recursive algorithm',
-            'caller_info': caller_info,
-            'instance_id': instance_id  # Include instance ID in response
-        })
-    }
+    return respond(200, {
+        'n': n,
+        'result': result,
+        'duration_seconds': round(duration, 4),
+        'function': 'fibonacci',
+        'note': 'Calculated using iterative algorithm',
+        'caller_info': caller_info,
+        'instance_id': INSTANCE_ID  # Include instance ID in response
+    })
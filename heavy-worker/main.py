@@ -1,13 +1,18 @@
 """
 Heavy Worker - Polling + Autoscaling Test
 
-This worker demonstrates the polling pattern for heavy analyzers:
-1. Polls MongoDB every 5 seconds for unclaimed requests
+This worker demonstrates the claim-work pattern for heavy analyzers:
+1. Watches a MongoDB change stream for new unclaimed requests
+   (and re-checks every 30 seconds as a polling fallback)
 2. Atomically claims work (prevents race conditions)
-3. Runs fibonacci calculation (simulates heavy work)
+3. Runs a timed CPU burn (simulates heavy work)
 4. CPU spike triggers autoscaling
 5. Scales down when no work available
-6. Runs 3 tasks in parallel per instance (maxes out single CPU)
+6. Runs 3 tasks in parallel per instance (maxes out single CPU);
+   --workers N / WORKERS=N changes this, and N=1 runs each task inline
+
+Usage:
+    python main.py [--workers N]
 
 Data Model:
     {
@@ -17,18 +22,25 @@ Data Model:
         "claimed_at": null,
         "completed": false,
         "result": null,
-        "n": 40  // fibonacci input
+        "burn_seconds": 30  // CPU-seconds to burn (0-300, default 30)
     }
 """
 
+import argparse
+import hashlib
 import os
 import socket
 import time
 import logging
+import math
+import multiprocessing
 import random
-from datetime import datetime
+from datetime import datetime, timezone
 from pymongo import MongoClient, ReturnDocument
-from multiprocessing import Pool
+from pymongo.errors import OperationFailure, PyMongoError
+from contextlib import ExitStack
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
 from functools import partial
 
 # Configure logging
@@ -45,28 +57,70 @@ MONGODB_DB = os.getenv("MONGODB_DATABASE", "heavy_worker_test")
 # Pod identifier
 POD_ID = f"{socket.gethostname()}-{os.getpid()}"
 
+# Change stream filter: fires when new unclaimed work is inserted
+NEW_WORK_PIPELINE = [
+    {"$match": {"operationType": "insert", "fullDocument.claimed": False}}
+]
+
+# Idle re-check interval, covers missed events and stream outages
+FALLBACK_POLL_SECONDS = 30
+
+# CPU burn per work item: default when unset, and upper bound - a running
+# burn cannot be cancelled, so an unbounded value would wedge a worker
+DEFAULT_BURN_SECONDS = 30
+MAX_BURN_SECONDS = 300
+
+# Retry delay after errors: doubles per consecutive failure, capped
+BACKOFF_INITIAL_SECONDS = 1.0
+BACKOFF_MAX_SECONDS = 60.0
+
+
+def burn_cpu(seconds: float) -> int:
+    """
+    Busy-loop SHA-256 for `seconds` of wall time - predictable CPU load.
 
-def fibonacci(n: int) -> int:
-    """Recursive Fibonacci - CPU intensive."""
-    if n <= 1:
-        return n
-    return fibonacci(n - 1) + fibonacci(n - 2)
+    Returns:
+        int: The number of hash rounds completed
+    """
+    deadline = time.perf_counter() + seconds
+    h = hashlib.sha256(b"")
+    rounds = 0
+    while time.perf_counter() < deadline:
+        h.update(h.digest())
+        rounds += 1
+    return rounds
 
 
 def get_mongo_db():
-    """Get MongoDB database connection."""
-    client = MongoClient(MONGODB_URI)
+    """
+    Get MongoDB database connection.
+
+    connect=False defers opening the connection pool until the first
+    operation, so no sockets or monitor threads exist before a fork.
+    """
+    client = MongoClient(
+        MONGODB_URI,
+        maxPoolSize=16,
+        connect=False,
+        serverSelectionTimeoutMS=5000
+    )
     return client[MONGODB_DB]
 
 
-def try_claim_work(db):
+def try_claim_work(db, claimed_at=None):
     """
     Atomically claim one piece of work from the database.
 
+    Args:
+        db: MongoDB database
+        claimed_at: Claim timestamp; defaults to now (UTC)
+
     Returns:
         dict or None: The claimed work item, or None if no work available
     """
     collection = db.requests
+    if claimed_at is None:
+        claimed_at = datetime.now(timezone.utc)
 
     # Atomic find and update - only one pod can claim each request
     work = collection.find_one_and_update(
@@ -77,7 +131,7 @@ def try_claim_work(db):
             "$set": {
                 "claimed": True,
                 "claimed_by": POD_ID,
-                "claimed_at": datetime.utcnow()
+                "claimed_at": claimed_at
             }
         },
         return_document=ReturnDocument.AFTER
@@ -86,9 +140,143 @@ def try_claim_work(db):
     return work
 
 
+def claim_work_batch(db, claim_executor, count):
+    """
+    Claim up to `count` work items with concurrent atomic claims.
+
+    pymongo is blocking, so each find_one_and_update runs on its own thread;
+    the batch costs roughly one round-trip instead of `count` serial ones.
+
+    Returns:
+        tuple: (claimed, all_failed) - the claimed work items (empty if no
+        work available), and True if every claim raised (MongoDB likely down)
+    """
+    # One timestamp for the whole batch
+    claimed_at = datetime.now(timezone.utc)
+    futures = [claim_executor.submit(try_claim_work, db, claimed_at) for _ in range(count)]
+
+    claimed = []
+    failures = 0
+    for future in futures:
+        # One failed claim must not drop work the other threads already claimed
+        try:
+            work = future.result()
+        except Exception as e:
+            logger.error(f"[{POD_ID}] Error claiming work: {str(e)}", exc_info=True)
+            failures += 1
+            continue
+        if work:
+            claimed.append(work)
+
+    return claimed, failures == len(futures)
+
+
+def open_work_stream(db):
+    """
+    Open a change stream on the requests collection for new work.
+
+    Change streams need a replica set and the changeStream privilege; if the
+    server refuses (OperationFailure) this logs a warning and the caller
+    falls back to polling.
+
+    Returns:
+        ChangeStream or None: The open stream, or None if the server refused
+
+    Raises:
+        PyMongoError: Any other (transient) failure, e.g. MongoDB unreachable
+    """
+    try:
+        return db.requests.watch(NEW_WORK_PIPELINE, max_await_time_ms=1000)
+    except OperationFailure as e:
+        logger.warning(f"[{POD_ID}] Change stream unavailable, polling every {FALLBACK_POLL_SECONDS}s: {str(e)}")
+        return None
+
+
+def wait_for_work(stream, timeout):
+    """
+    Block until the change stream reports new work or the timeout elapses.
+
+    Args:
+        stream: Open change stream (see open_work_stream)
+        timeout: Maximum seconds to wait
+
+    Returns:
+        bool: True if new work was announced, False on timeout
+    """
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        # Waits server-side up to max_await_time_ms for the next event
+        if stream.try_next() is not None:
+            return True
+    return False
+
+
+def sleep_with_backoff(backoff):
+    """
+    Sleep for a jittered `backoff` seconds after an error.
+
+    Jitter (0.5x-1.5x) keeps pods that failed together from retrying in
+    lockstep against a recovering MongoDB.
+
+    Returns:
+        float: The backoff to use if the next attempt also fails
+    """
+    time.sleep(min(backoff * (0.5 + random.random()), BACKOFF_MAX_SECONDS))
+    return min(backoff * 2, BACKOFF_MAX_SECONDS)
+
+
+def make_worker_pool(workers):
+    """
+    Create the pool of worker processes that run process_work.
+
+    The executor starts its processes lazily, after the MongoClient exists,
+    so use spawn: forked workers would inherit pymongo sockets (pymongo is
+    not fork-safe).
+    """
+    return ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=init_worker,
+        initargs=(POD_ID,)
+    )
+
+
+def init_worker(pod_id):
+    """Worker process initializer: log under the parent pod's POD_ID."""
+    global POD_ID
+    POD_ID = pod_id
+
+
+def get_burn_seconds(work):
+    """
+    Read and validate a work item's burn_seconds.
+
+    Raises:
+        ValueError: If the value is not a finite number in
+            [0, MAX_BURN_SECONDS], or the item only has the legacy "n" field
+    """
+    if "burn_seconds" not in work:
+        if "n" in work:
+            # Pre-burn_cpu producers wrote a fibonacci input - no sane mapping
+            raise ValueError('legacy field "n" is no longer supported, set "burn_seconds" instead')
+        return DEFAULT_BURN_SECONDS
+
+    raw = work["burn_seconds"]
+    # bool is an int subclass - float(True) would silently become 1.0
+    if isinstance(raw, bool):
+        raise ValueError(f"burn_seconds must be a number, got {raw!r}")
+    try:
+        burn_seconds = float(raw)
+    except (TypeError, ValueError):
+        raise ValueError(f"burn_seconds must be a number, got {raw!r}")
+    if not math.isfinite(burn_seconds) or not 0 <= burn_seconds <= MAX_BURN_SECONDS:
+        raise ValueError(f"burn_seconds must be between 0 and {MAX_BURN_SECONDS}, got {burn_seconds}")
+    return burn_seconds
+
+
 def process_work(work):
     """
-    Process the claimed work (run fibonacci calculation).
+    Process the claimed work (run a timed CPU burn).
     This runs in a separate process.
 
     Args:
@@ -99,24 +287,31 @@ def process_work(work):
         error is None on success, or error message on failure
     """
     request_id = work.get("request_id")
-    n = work.get("n", 40)
     worker_pid = os.getpid()
 
+    # Reject bad input before burning anything
+    try:
+        burn_seconds = get_burn_seconds(work)
+    except ValueError as e:
+        error_msg = f"Invalid work item: {str(e)}"
+        logger.error(f"[{POD_ID}-worker-{worker_pid}] {error_msg}")
+        return (request_id, None, 0, error_msg)
+
     try:
-        logger.info(f"[{POD_ID}-worker-{worker_pid}] Processing request {request_id}, fibonacci({n})...")
+        logger.info(f"[{POD_ID}-worker-{worker_pid}] Processing request {request_id}, burn_cpu({burn_seconds})...")
 
         # Heavy work - CPU spikes here, triggers autoscaling
         start_time = time.time()
-        result = fibonacci(n)
+        result = burn_cpu(burn_seconds)
         duration = time.time() - start_time
 
-        logger.info(f"[{POD_ID}-worker-{worker_pid}] Completed in {duration:.2f}s. Result: {result}")
+        logger.info(f"[{POD_ID}-worker-{worker_pid}] Completed in {duration:.2f}s. Hash rounds: {result}")
 
         return (request_id, result, duration, None)
 
     except Exception as e:
         duration = time.time() - start_time if 'start_time' in locals() else 0
-        error_msg = f"Error processing fibonacci({n}): {str(e)}"
+        error_msg = f"Error processing burn_cpu({burn_seconds}): {str(e)}"
         logger.error(f"[{POD_ID}-worker-{worker_pid}] {error_msg}", exc_info=True)
         return (request_id, None, duration, error_msg)
 
@@ -136,7 +331,7 @@ def mark_completed(db, result_tuple):
         update_data = {
             "completed": True,
             "duration_seconds": duration,
-            "completed_at": datetime.utcnow()
+            "completed_at": datetime.now(timezone.utc)
         }
 
         # If there was an error, mark as failed
@@ -162,81 +357,223 @@ def mark_completed(db, result_tuple):
         logger.error(f"[{POD_ID}] Failed to update database for {request_id}: {str(e)}", exc_info=True)
 
 
-def main():
+def release_work(db, work):
+    """
+    Return claimed-but-unstarted work to the queue so another pod can take it.
+
+    Args:
+        db: MongoDB database
+        work: The claimed work item
+    """
+    request_id = work.get("request_id")
+
+    try:
+        db.requests.update_one(
+            {"request_id": request_id, "claimed_by": POD_ID},
+            {"$set": {"claimed": False, "claimed_by": None, "claimed_at": None}}
+        )
+        logger.info(f"[{POD_ID}] Released {request_id} back to the queue")
+
+    except Exception as e:
+        logger.error(f"[{POD_ID}] Failed to release {request_id}: {str(e)}", exc_info=True)
+
+
+def main(workers=3):
     """
-    Main worker loop - polls for work and processes it in parallel.
+    Main worker loop - waits for work and processes it in parallel.
 
-    Runs up to 3 fibonacci calculations concurrently per instance.
+    Runs up to `workers` CPU burns concurrently per instance. With
+    workers=1 there is no pool: each burn runs inline in this process.
     """
     # Random startup delay to test log connection timing
     startup_sleep = random.randint(1, 10)
     time.sleep(startup_sleep)
     logger.info(f"[{POD_ID}] Worker online -- slept {startup_sleep} seconds at startup")
 
+    # Create pool of worker processes
+    if workers > 1:
+        try:
+            executor = make_worker_pool(workers)
+            logger.info(f"[{POD_ID}] Created worker pool with {workers} processes")
+        except Exception as e:
+            logger.error(f"[{POD_ID}] Failed to create worker pool: {str(e)}", exc_info=True)
+            raise
+    else:
+        executor = None
+        logger.info(f"[{POD_ID}] Single worker, processing work inline")
+
     try:
         db = get_mongo_db()
-        logger.info(f"[{POD_ID}] Connected to MongoDB")
+        logger.info(f"[{POD_ID}] MongoDB client ready (connects on first use)")
     except Exception as e:
         logger.error(f"[{POD_ID}] Failed to connect to MongoDB: {str(e)}", exc_info=True)
         raise
 
-    # Create pool of 3 worker processes
-    try:
-        pool = Pool(processes=3)
-        logger.info(f"[{POD_ID}] Created worker pool with 3 processes")
-    except Exception as e:
-        logger.error(f"[{POD_ID}] Failed to create worker pool: {str(e)}", exc_info=True)
-        raise
-
-    with pool:
-        active_tasks = []  # List of (AsyncResult, work_dict) tuples
+    # Threads for issuing blocking MongoDB claims concurrently
+    claim_executor = ThreadPoolExecutor(max_workers=workers)
+
+    # One thread owns the change stream, so its wait can be raced against
+    # task completions with concurrent.futures.wait
+    stream_executor = ThreadPoolExecutor(max_workers=1)
+
+    def replace_broken_pool(error):
+        """
+        Fail in-flight work and start a fresh pool after a worker died.
+
+        ProcessPoolExecutor does not respawn a killed child (OOM, SIGKILL);
+        once broken, every pending future fails and every submit raises.
+        The item that killed the worker cannot be told apart, so all
+        in-flight items are marked failed rather than re-queued.
+        """
+        nonlocal executor
+        logger.error(f"[{POD_ID}] Worker pool broken, rebuilding: {error}")
+        for work in active_tasks.values():
+            mark_completed(db, (work.get("request_id"), None, 0, f"Worker process died: {error}"))
+        active_tasks.clear()
+        executor.shutdown(wait=False, cancel_futures=True)
+        executor = make_worker_pool(workers)
+
+    def shutdown_pool():
+        """Shut down whichever pool is current - it may have been replaced."""
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    active_tasks = {}  # Future -> work_dict
+
+    with claim_executor, stream_executor, ExitStack() as stack:
+        stack.callback(shutdown_pool)
+        stream = None
+        stream_wait = None  # Pending wait_for_work future, kept across passes
+        next_stream_attempt = 0.0  # monotonic time; pushed out after a refusal
+        backoff = BACKOFF_INITIAL_SECONDS
 
         while True:
             try:
+                # Open the stream before claiming so no insert slips in between
+                if stream is None and time.monotonic() >= next_stream_attempt:
+                    try:
+                        stream = open_work_stream(db)
+                    except PyMongoError as e:
+                        logger.warning(f"[{POD_ID}] Could not open change stream, backing off: {str(e)}")
+                        backoff = sleep_with_backoff(backoff)
+                        continue
+                    if stream is None:
+                        # Refused by the server - don't re-ask on every pass
+                        next_stream_attempt = time.monotonic() + FALLBACK_POLL_SECONDS
+
                 # Clean up completed tasks
-                still_active = []
-                for async_result, work in active_tasks:
-                    if async_result.ready():
-                        # Task completed, mark in database
-                        try:
-                            result_tuple = async_result.get()
-                            mark_completed(db, result_tuple)
-                        except Exception as e:
-                            logger.error(f"[{POD_ID}] Error completing task: {e}", exc_info=True)
-                    else:
-                        # Still running
-                        still_active.append((async_result, work))
+                broken_error = None
+                for future in [f for f in active_tasks if f.done()]:
+                    work = active_tasks.pop(future)
+                    try:
+                        result_tuple = future.result()
+                    except BrokenProcessPool as e:
+                        broken_error = e
+                        result_tuple = (work.get("request_id"), None, 0, f"Worker process died: {e}")
+                    except Exception as e:
+                        logger.error(f"[{POD_ID}] Error completing task: {e}", exc_info=True)
+                        result_tuple = (work.get("request_id"), None, 0, f"Worker failed: {e}")
+                    # Task completed, mark in database
+                    mark_completed(db, result_tuple)
 
-                active_tasks = still_active
+                if broken_error is not None:
+                    replace_broken_pool(broken_error)
 
                 # Try to claim more work if we have capacity
-                if len(active_tasks) < 3:
+                slots_free = workers - len(active_tasks)
+                if slots_free > 0:
                     try:
-                        work = try_claim_work(db)
+                        claimed, all_failed = claim_work_batch(db, claim_executor, slots_free)
+
+                        for index, work in enumerate(claimed):
+                            if executor is None:
+                                # Single worker - run inline, nothing to track
+                                logger.info(f"[{POD_ID}] Claimed work, processing inline")
+                                mark_completed(db, process_work(work))
+                                continue
 
-                        if work:
                             # Submit work to pool
-                            logger.info(f"[{POD_ID}] Claimed work, submitting to pool ({len(active_tasks)+1}/3 slots used)")
-                            async_result = pool.apply_async(process_work, (work,))
-                            active_tasks.append((async_result, work))
+                            logger.info(f"[{POD_ID}] Claimed work, submitting to pool ({len(active_tasks)+1}/{workers} slots used)")
+                            try:
+                                future = executor.submit(process_work, work)
+                            except BrokenProcessPool as e:
+                                # Never started - hand back to the queue
+                                for unsubmitted in claimed[index:]:
+                                    release_work(db, unsubmitted)
+                                replace_broken_pool(e)
+                                break
+                            active_tasks[future] = work
+
+                        if all_failed:
+                            # Every claim errored - MongoDB is likely down
+                            logger.warning(f"[{POD_ID}] All claims failed, backing off")
+                            backoff = sleep_with_backoff(backoff)
+                            continue
+
+                        # Claims reached MongoDB - clear any backoff
+                        backoff = BACKOFF_INITIAL_SECONDS
+
+                        if claimed:
                             # Immediately try to claim more work
                             continue
                     except Exception as e:
                         logger.error(f"[{POD_ID}] Error claiming or submitting work: {str(e)}", exc_info=True)
 
-                # If pool is full or no work available, sleep briefly
-                if len(active_tasks) >= 3:
-                    logger.debug(f"[{POD_ID}] All 3 workers busy, waiting...")
-                    time.sleep(1)  # Short sleep, check for completions soon
+                # If pool is full or no work available, wait
+                if len(active_tasks) >= workers:
+                    logger.debug(f"[{POD_ID}] All {workers} workers busy, waiting...")
+                    # Wakes as soon as any worker finishes
+                    wait(active_tasks, timeout=FALLBACK_POLL_SECONDS, return_when=FIRST_COMPLETED)
                 else:
-                    # No work available and pool not full
-                    logger.info(f"[{POD_ID}] No work available, sleeping 5s...")
-                    time.sleep(5)
+                    # No work available and pool not full - wake on the next
+                    # insert or task completion, whichever comes first
+                    timeout = 1 if active_tasks and stream is None else FALLBACK_POLL_SECONDS
+                    if not active_tasks:
+                        logger.info(f"[{POD_ID}] No work available, waiting up to {timeout}s...")
+                    if stream is None and active_tasks:
+                        wait(active_tasks, timeout=timeout, return_when=FIRST_COMPLETED)
+                    elif stream is None:
+                        time.sleep(timeout)
+                    else:
+                        if stream_wait is None:
+                            stream_wait = stream_executor.submit(wait_for_work, stream, timeout)
+                        # wait_for_work returns within its timeout, so no limit here
+                        wait([stream_wait, *active_tasks], return_when=FIRST_COMPLETED)
+                        if not stream_wait.done():
+                            # A task finished first - collect it, keep the stream wait
+                            continue
+
+                        finished, stream_wait = stream_wait, None
+                        try:
+                            finished.result()
+                        except PyMongoError as e:
+                            logger.warning(f"[{POD_ID}] Change stream lost, reopening: {str(e)}")
+                            stream.close()
+                            stream = None
+                            backoff = sleep_with_backoff(backoff)
+                            continue
 
             except Exception as e:
                 logger.error(f"[{POD_ID}] Error in main loop: {e}", exc_info=True)
-                time.sleep(5)
+                backoff = sleep_with_backoff(backoff)
+
+
+def parse_args():
+    """Parse command-line options (WORKERS env var sets the default)."""
+    parser = argparse.ArgumentParser(description="Heavy worker - claims work from MongoDB and burns CPU")
+    parser.add_argument(
+        "--workers",
+        type=int,
+        # A string default goes through type=int, so a bad WORKERS value is
+        # reported as a usage error rather than a traceback
+        default=os.getenv("WORKERS", "3"),
+        help="Tasks to run in parallel per instance; 1 runs inline without a pool (default: 3)"
+    )
+    args = parser.parse_args()
+    if args.workers < 1:
+        parser.error("--workers must be at least 1")
+    return args
 
 
 if __name__ == "__main__":
-    main()
+    main(workers=parse_args().workers)